@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, send_file
+from flask import Flask, render_template, request, redirect, url_for, session, flash, get_flashed_messages, send_file, make_response
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -10,6 +10,10 @@ import ollama
 from datetime import datetime
 import json
 import re
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 # Load environment variables
 load_dotenv()
@@ -21,6 +25,11 @@ app.config['UPLOAD_FOLDER'] = os.path.join(BASE_DIR, 'uploads')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max
 app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'pdf'}
 
+# Ollama client; no timeout unless OLLAMA_TIMEOUT is set, since CPU-only
+# generations running in parallel can legitimately take several minutes
+ollama_timeout = os.getenv('OLLAMA_TIMEOUT')
+ollama_client = ollama.Client(timeout=float(ollama_timeout) if ollama_timeout else None)
+
 # Ensure upload folder exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
@@ -94,14 +103,16 @@ Text:
 Output only the masked text:"""
 
     try:
-        response = ollama.chat(
+        response = ollama_client.chat(
             model=model_name,
             messages=[{'role': 'user', 'content': prompt}],
             options={'temperature': 0.1}
         )
         return response['message']['content']
     except Exception as e:
-        return text
+        # Never fall back to the raw text: it would be stored as masked
+        print(f"Error: {e}")
+        return None
 
 # Extract medicine data
 def extract_medicine_data(ocr_text):
@@ -128,7 +139,7 @@ OCR Text:
 JSON:"""
 
     try:
-        response = ollama.chat(
+        response = ollama_client.chat(
             model=model_name,
             messages=[{'role': 'user', 'content': prompt}],
             options={'temperature': 0.1}
@@ -148,6 +159,105 @@ JSON:"""
         print(f"Error: {e}")
         return {"medicines": []}
 
+# LLM request pool
+# Runs Ollama calls from concurrent uploads side by side, up to
+# OLLAMA_NUM_PARALLEL at once, so the model server's parallel slots stay busy.
+# Calls are sent as soon as a slot is free and only queue while all slots are
+# busy. Each prescription keeps its own prompt, so PII never crosses between
+# documents and every future resolves to its own result.
+llm_executor = ThreadPoolExecutor(max_workers=max(1, int(os.getenv('OLLAMA_NUM_PARALLEL', 4))))
+
+# Dashboard cache backends
+# Rendered dashboards are stored per user under a version counter that is
+# bumped whenever that user's prescriptions change, so stale pages are never
+# served and old entries simply age out.
+class MemoryDashboardCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.pages = OrderedDict()
+        self.versions = {}
+        self.lock = threading.Lock()
+        # Start from the boot time so ETags issued before a restart never match
+        self.initial_version = time.time_ns()
+
+    def get_version(self, user_id):
+        with self.lock:
+            return self.versions.get(user_id, self.initial_version)
+
+    def bump_version(self, user_id):
+        with self.lock:
+            self.versions[user_id] = self.versions.get(user_id, self.initial_version) + 1
+
+    def get_page(self, user_id, version):
+        with self.lock:
+            key = (user_id, version)
+            if key not in self.pages:
+                return None
+            self.pages.move_to_end(key)
+            return self.pages[key]
+
+    def set_page(self, user_id, version, html):
+        with self.lock:
+            self.pages[(user_id, version)] = html
+            self.pages.move_to_end((user_id, version))
+            while len(self.pages) > self.max_entries:
+                self.pages.popitem(last=False)
+
+class RedisDashboardCache:
+    def __init__(self, url, ttl):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def _seed_version(self, key):
+        # Seed missing counters from the current time so an evicted or flushed
+        # key never restarts at a version that old pages or ETags still use
+        self.client.set(key, time.time_ns(), nx=True)
+
+    def get_version(self, user_id):
+        key = f'dashboard:version:{user_id}'
+        self._seed_version(key)
+        return int(self.client.get(key))
+
+    def bump_version(self, user_id):
+        key = f'dashboard:version:{user_id}'
+        self._seed_version(key)
+        self.client.incr(key)
+
+    def get_page(self, user_id, version):
+        html = self.client.get(f'dashboard:page:{user_id}:{version}')
+        return html.decode('utf-8') if html else None
+
+    def set_page(self, user_id, version, html):
+        self.client.set(f'dashboard:page:{user_id}:{version}', html, ex=self.ttl)
+
+# The memory backend keeps its version counters inside this process, so it is
+# only correct with a single worker; use redis for multi-process deployments
+def create_dashboard_cache():
+    backend = os.getenv('DASHBOARD_CACHE', 'memory')
+    if backend == 'redis':
+        return RedisDashboardCache(
+            url=os.getenv('REDIS_URL', 'redis://localhost:6379/0'),
+            ttl=int(os.getenv('DASHBOARD_CACHE_TTL', 3600))
+        )
+    return MemoryDashboardCache(max_entries=int(os.getenv('DASHBOARD_CACHE_SIZE', 256)))
+
+dashboard_cache = create_dashboard_cache()
+
+# Cache calls are best-effort: on a cache outage log it and carry on uncached
+def dashboard_cache_call(method, *args):
+    try:
+        return method(*args)
+    except Exception as e:
+        print(f"Dashboard cache error: {e}")
+        return None
+
+def dashboard_response(html, etag, status=200):
+    response = make_response(html, status)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 # Home - Login
 @app.route('/')
 def index():
@@ -274,6 +384,22 @@ def patient_dashboard():
     if 'user_id' not in session or session['role'] != 'patient':
         return redirect(url_for('index'))
     
+    user_id = session['user_id']
+    version = dashboard_cache_call(dashboard_cache.get_version, user_id)
+    etag = f'{user_id}-{version}'
+    
+    # Pending flash messages are part of the page, so skip the cache for them,
+    # as well as when the cache is unreachable
+    cacheable = version is not None and not get_flashed_messages()
+    
+    if cacheable:
+        if etag in request.if_none_match:
+            return dashboard_response('', etag, status=304)
+        
+        html = dashboard_cache_call(dashboard_cache.get_page, user_id, version)
+        if html is not None:
+            return dashboard_response(html, etag)
+    
     conn = get_db_connection()
     cur = conn.cursor(cursor_factory=RealDictCursor)
     
@@ -299,7 +425,13 @@ def patient_dashboard():
     cur.close()
     conn.close()
     
-    return render_template('patient_dashboard.html', prescriptions=prescriptions)
+    html = render_template('patient_dashboard.html', prescriptions=prescriptions)
+    
+    if not cacheable:
+        return html
+    
+    dashboard_cache_call(dashboard_cache.set_page, user_id, version, html)
+    return dashboard_response(html, etag)
 
 # Upload Prescription
 @app.route('/upload_prescription', methods=['POST'])
@@ -333,11 +465,11 @@ def upload_prescription():
             flash(f'OCR Error: {ocr_error}', 'error')
             return redirect(url_for('patient_dashboard'))
         
-        # Mask PII
-        masked_text = mask_pii(ocr_text)
-        
-        # Extract medicines
-        medicine_data = extract_medicine_data(ocr_text)
+        # Mask PII and extract medicines (alongside other uploads)
+        masked_future = llm_executor.submit(mask_pii, ocr_text)
+        medicine_future = llm_executor.submit(extract_medicine_data, ocr_text)
+        masked_text = masked_future.result()
+        medicine_data = medicine_future.result()
         
         # Save to database
         conn = get_db_connection()
@@ -388,6 +520,8 @@ def upload_prescription():
         cur.close()
         conn.close()
         
+        dashboard_cache_call(dashboard_cache.bump_version, session['user_id'])
+        
         flash('Prescription uploaded and processed successfully!', 'success')
         return redirect(url_for('patient_dashboard'))
     
@@ -507,11 +641,11 @@ def delete_prescription(prescription_id):
     # Check access rights
     if session['role'] == 'patient':
         # Patient can only delete their own prescriptions
-        cur.execute('SELECT prescription_id, image_filename FROM prescriptions WHERE prescription_id = %s AND patient_id = %s', 
+        cur.execute('SELECT prescription_id, patient_id, image_filename FROM prescriptions WHERE prescription_id = %s AND patient_id = %s', 
                    (prescription_id, session['user_id']))
     elif session['role'] == 'staff':
         # Staff can delete any prescription
-        cur.execute('SELECT prescription_id, image_filename FROM prescriptions WHERE prescription_id = %s', 
+        cur.execute('SELECT prescription_id, patient_id, image_filename FROM prescriptions WHERE prescription_id = %s', 
                    (prescription_id,))
     else:
         cur.close()
@@ -539,6 +673,8 @@ def delete_prescription(prescription_id):
         except Exception as e:
             conn.rollback()
             flash(f'Error deleting prescription: {str(e)}', 'error')
+        else:
+            dashboard_cache_call(dashboard_cache.bump_version, prescription['patient_id'])
     else:
         flash('Prescription not found or access denied', 'error')
     
@@ -0,0 +1,83 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import app
+
+# Fake ollama chat: echoes the document tag back after a short delay so
+# results can be matched to the prescription they came from
+active = 0
+peak = 0
+lock = threading.Lock()
+
+def fake_chat(model, messages, options):
+    global active, peak
+    with lock:
+        active += 1
+        peak = max(peak, active)
+
+    prompt = messages[0]['content']
+    tag = prompt.split('DOC-')[1].split()[0]
+    time.sleep(0.2 if tag != '0' else 2.0)
+
+    with lock:
+        active -= 1
+
+    if 'JSON' in prompt:
+        content = '{"medicines": [{"name": "Med-%s"}]}' % tag
+    else:
+        content = f'masked DOC-{tag}'
+    return {'message': {'content': content}}
+
+def failing_chat(model, messages, options):
+    raise TimeoutError('timed out')
+
+# Dedicated pool so the checks don't depend on OLLAMA_NUM_PARALLEL in .env
+num_parallel = 4
+app.llm_executor = ThreadPoolExecutor(max_workers=num_parallel)
+app.ollama_client.chat = fake_chat
+
+print("TEST 1: Results map back to each prescription")
+print("=" * 70)
+texts = [f'Patient DOC-{i} Remdesivir 100mg' for i in range(8)]
+start = time.monotonic()
+masked_futures = [app.llm_executor.submit(app.mask_pii, t) for t in texts]
+medicine_futures = [app.llm_executor.submit(app.extract_medicine_data, t) for t in texts]
+
+for i in range(8):
+    assert masked_futures[i].result() == f'masked DOC-{i}'
+    assert medicine_futures[i].result() == {'medicines': [{'name': f'Med-{i}'}]}
+print(f"✅ 16 calls mapped back correctly in {time.monotonic() - start:.2f}s")
+print(f"✅ Peak concurrency {peak} (limit {num_parallel})")
+assert peak == num_parallel
+print("=" * 70)
+
+print("\n\nTEST 2: A slow call does not hold back the rest")
+print("=" * 70)
+start = time.monotonic()
+slow = app.llm_executor.submit(app.mask_pii, 'Patient DOC-0')
+fast = [app.llm_executor.submit(app.mask_pii, f'Patient DOC-{i}') for i in range(1, 7)]
+for future in fast:
+    future.result()
+elapsed = time.monotonic() - start
+print(f"✅ Fast calls finished in {elapsed:.2f}s while slow call still running: {not slow.done()}")
+assert elapsed < 1.5 and not slow.done()
+slow.result()
+print("=" * 70)
+
+print("\n\nTEST 3: A lone upload is dispatched immediately")
+print("=" * 70)
+start = time.monotonic()
+app.llm_executor.submit(app.mask_pii, 'Patient DOC-1').result()
+elapsed = time.monotonic() - start
+print(f"✅ Single call finished in {elapsed:.2f}s")
+assert elapsed < 1.0
+print("=" * 70)
+
+print("\n\nTEST 4: Ollama errors fall back to defaults")
+print("=" * 70)
+app.ollama_client.chat = failing_chat
+text = 'Patient DOC-1 Remdesivir 100mg'
+assert app.llm_executor.submit(app.mask_pii, text).result() is None
+assert app.llm_executor.submit(app.extract_medicine_data, text).result() == {'medicines': []}
+print("✅ mask_pii returned None (raw text never stored as masked), extract_medicine_data returned no medicines")
+print("=" * 70)
@@ -0,0 +1,188 @@
+import io
+import atexit
+import tempfile
+from datetime import datetime
+import app
+
+# In-memory stand-in for the prescriptions tables, enough for the
+# dashboard, upload and delete routes
+prescriptions = {}
+queries = []
+
+class FakeCursor:
+    def __init__(self):
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        sql = ' '.join(sql.split())
+        queries.append(sql)
+
+        if sql.startswith('SELECT p.prescription_id, p.upload_date'):
+            self.rows = [dict(p) for p in prescriptions.values() if p['patient_id'] == params[0]]
+        elif sql.startswith('INSERT INTO prescriptions'):
+            prescription_id = len(prescriptions) + 1
+            prescriptions[prescription_id] = {
+                'prescription_id': prescription_id,
+                'patient_id': params[0],
+                'image_filename': params[1],
+                'upload_date': datetime.now(),
+            }
+            self.rows = [(prescription_id,)]
+        elif sql.startswith('SELECT prescription_id, patient_id, image_filename'):
+            p = prescriptions.get(params[0])
+            self.rows = [dict(p)] if p and (len(params) == 1 or p['patient_id'] == params[1]) else []
+        elif sql.startswith('DELETE FROM prescriptions'):
+            prescriptions.pop(params[0], None)
+            self.rows = []
+        else:
+            self.rows = []
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+class FakeConnection:
+    def cursor(self, cursor_factory=None):
+        return FakeCursor()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+def dashboard_queries():
+    return sum(1 for q in queries if q.startswith('SELECT p.prescription_id, p.upload_date'))
+
+def login(client, user_id, role):
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+        sess['username'] = f'user{user_id}'
+        sess['role'] = role
+        sess['full_name'] = f'User {user_id}'
+
+app.get_db_connection = FakeConnection
+app.extract_text_from_image = lambda path: ('Patient Narmalan Remdesivir 100mg', None)
+app.mask_pii = lambda text: 'Patient [PATIENT_NAME] Remdesivir 100mg'
+app.extract_medicine_data = lambda text: {'medicines': []}
+app.dashboard_cache = app.MemoryDashboardCache(max_entries=16)
+app.app.config['TESTING'] = True
+
+# Keep test uploads out of the real uploads folder, even if a check fails
+upload_dir = tempfile.TemporaryDirectory()
+atexit.register(upload_dir.cleanup)
+app.app.config['UPLOAD_FOLDER'] = upload_dir.name
+
+patient = app.app.test_client()
+login(patient, 1, 'patient')
+
+print("TEST 1: Repeat views skip the database")
+print("=" * 70)
+first = patient.get('/patient/dashboard')
+etag = first.headers['ETag']
+patient.get('/patient/dashboard')
+print(f"✅ Two views, {dashboard_queries()} dashboard query, ETag {etag}")
+assert first.status_code == 200 and dashboard_queries() == 1
+print("=" * 70)
+
+print("\n\nTEST 2: Matching ETag returns 304")
+print("=" * 70)
+response = patient.get('/patient/dashboard', headers={'If-None-Match': etag})
+print(f"✅ Status {response.status_code}")
+assert response.status_code == 304 and dashboard_queries() == 1
+print("=" * 70)
+
+print("\n\nTEST 3: Upload bumps the version and flash skips the cache")
+print("=" * 70)
+response = patient.post('/upload_prescription',
+                        data={'prescription': (io.BytesIO(b'fake image'), 'rx.png')},
+                        content_type='multipart/form-data')
+assert response.status_code == 302
+flashed = patient.get('/patient/dashboard', headers={'If-None-Match': etag})
+assert flashed.status_code == 200
+assert b'uploaded and processed successfully' in flashed.data
+assert 'ETag' not in flashed.headers
+print("✅ Page with flash rendered fresh and not cached")
+fresh = patient.get('/patient/dashboard', headers={'If-None-Match': etag})
+new_etag = fresh.headers['ETag']
+assert fresh.status_code == 200 and new_etag != etag
+assert b'uploaded and processed successfully' not in fresh.data
+print(f"✅ Old ETag rejected, new ETag {new_etag}, {dashboard_queries()} dashboard queries")
+assert dashboard_queries() == 3
+print("=" * 70)
+
+print("\n\nTEST 4: Staff delete bumps the patient's version")
+print("=" * 70)
+staff = app.app.test_client()
+login(staff, 2, 'staff')
+prescription_id = next(iter(prescriptions))
+staff.post(f'/prescription/delete/{prescription_id}')
+response = patient.get('/patient/dashboard', headers={'If-None-Match': new_etag})
+print(f"✅ Status {response.status_code}, ETag {response.headers['ETag']}")
+assert response.status_code == 200 and response.headers['ETag'] != new_etag
+assert not prescriptions and dashboard_queries() == 4
+print("=" * 70)
+
+print("\n\nTEST 5: Redis versions survive a lost key")
+print("=" * 70)
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = str(value).encode()
+        return True
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, 0)) + 1).encode()
+
+cache = app.RedisDashboardCache.__new__(app.RedisDashboardCache)
+cache.client = FakeRedis()
+cache.ttl = 60
+old_version = cache.get_version(1)
+cache.set_page(1, old_version, 'old page')
+cache.bump_version(1)
+del cache.client.data['dashboard:version:1']
+new_version = cache.get_version(1)
+print(f"✅ Version after eviction {new_version} (was {old_version})")
+assert new_version > old_version + 1 and cache.get_page(1, new_version) is None
+print("=" * 70)
+
+print("\n\nTEST 6: A cache outage falls back to the database")
+print("=" * 70)
+
+class BrokenCache:
+    def __getattr__(self, name):
+        def fail(*args):
+            raise ConnectionError('cache down')
+        return fail
+
+app.dashboard_cache = BrokenCache()
+before = dashboard_queries()
+response = patient.get('/patient/dashboard')
+assert response.status_code == 200 and 'ETag' not in response.headers
+patient.post('/upload_prescription',
+             data={'prescription': (io.BytesIO(b'fake image'), 'rx.png')},
+             content_type='multipart/form-data')
+assert b'uploaded and processed successfully' in patient.get('/patient/dashboard').data
+prescription_id = next(iter(prescriptions))
+staff.post(f'/prescription/delete/{prescription_id}')
+with staff.session_transaction() as sess:
+    messages = [message for _, message in sess.get('_flashes', [])]
+assert messages[-1] == 'Prescription deleted successfully!' and not prescriptions
+print(f"✅ Dashboard, upload and delete all succeeded, {dashboard_queries() - before} dashboard queries")
+print("=" * 70)